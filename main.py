@@ -1,6 +1,13 @@
 import pandas as pd
+import numpy as np
 import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import folium
 from folium.features import GeoJsonTooltip
 
@@ -13,51 +20,120 @@ import panel as pn
 import osmnx as ox
 
 
+age_columns = ['Rates.Age.< 18', 'Rates.Age.18-45', 'Rates.Age.45-64', 'Rates.Age.> 64']
+
+# Create a mapping of the types to more friendly names
+type_to_name = {
+    'Types.Breast.Total': 'Breast Cancer',
+    'Types.Colorectal.Total': 'Colorectal Cancer',
+    'Types.Lung.Total': 'Lung Cancer'
+}
+
+# Define categories and races for the bar chart
+races = ['White', 'Hispanic', 'Asian', 'Black', 'Indigenous']
+genders = ['Female', 'Male']
+race_gender_columns = [f'Rates.Race and Sex.{gender}.{race}' for race in races for gender in genders]
+
+# Only the columns used by the dashboard are loaded
+used_columns = ['State', 'Total.Number', 'Total.Population'] + age_columns + list(type_to_name) + race_gender_columns
+
 file_path = '/data/cancer.csv'
-data = pd.read_csv(file_path)
+data = pd.read_csv(file_path, engine='pyarrow', usecols=used_columns)
+
+# Totals are whole counts well below the int32 limit; rates only need float32 precision
+total_columns = ['Total.Number', 'Total.Population']
+rate_columns = [col for col in used_columns if col not in ['State'] + total_columns]
+data = data.astype({**dict.fromkeys(total_columns, 'int32'), **dict.fromkeys(rate_columns, 'float32')})
+
+
+# Nominatim allows at most one request per second, so the worker threads share this throttle
+NOMINATIM_MIN_INTERVAL = 1.0
+_nominatim_lock = threading.Lock()
+_nominatim_last_call = 0.0
+
+
+def _wait_for_nominatim():
+    global _nominatim_last_call
+    with _nominatim_lock:
+        wait = _nominatim_last_call + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _nominatim_last_call = time.monotonic()
+
+
+# State centroids never change, so geocoding results are persisted between runs
+geocode_cache_path = '/data/geocode_cache.json'
+try:
+    with open(geocode_cache_path) as f:
+        geocode_cache = json.load(f)
+except (OSError, ValueError):
+    geocode_cache = {}
 
 
 def geocode_state(state_name):
+    if state_name in geocode_cache:
+        return tuple(geocode_cache[state_name])
     try:
+        _wait_for_nominatim()
         # Get the latitude and longitude using osmnx
         location = ox.geocode(state_name)
+        geocode_cache[state_name] = [location[0], location[1]]
         return location[0], location[1]  # latitude, longitude
     except Exception as e:
         print(f"Error geocoding {state_name}: {e}")
         return None, None
 # Ensure the DataFrame has a 'State' column and geocode
 if 'State' in data.columns:
-    data[['Latitude', 'Longitude']] = data['State'].apply(lambda x: geocode_state(x)).apply(pd.Series)
+    # Geocode each state once, overlapping the network round-trips across worker threads
+    unique_states = data['State'].dropna().unique()
+    cached_count = len(geocode_cache)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        coords = dict(zip(unique_states, executor.map(geocode_state, unique_states)))
+    # Only rewrite the cache file when new states were geocoded
+    if len(geocode_cache) > cached_count:
+        try:
+            with open(geocode_cache_path, 'w') as f:
+                json.dump(geocode_cache, f)
+        except OSError as e:
+            print(f"Error writing geocode cache: {e}")
+    data[['Latitude', 'Longitude']] = data['State'].map(coords).apply(pd.Series)
 else:
     print("Error: No 'State' column found in the CSV file.")
 
+# Shared session so remote downloads reuse pooled keep-alive connections
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(max_retries=3, pool_connections=10, pool_maxsize=10))
+
 url = 'https://raw.githubusercontent.com/PublicaMundi/MappingAPI/master/data/geojson/us-states.json'
-states_geojson = json.loads(requests.get(url).text)
+states_geojson = orjson.loads(http_session.get(url).content)
 
 # Integrate 'Total.Number' and age-specific rates into the GeoJSON features
-age_columns = ['Rates.Age.< 18', 'Rates.Age.18-45', 'Rates.Age.45-64', 'Rates.Age.> 64']
+feature_columns = ['Total.Number', 'Total.Population'] + age_columns
+# Build the per-state records once instead of masking the DataFrame for every feature
+state_records = data.drop_duplicates('State').set_index('State')[feature_columns].to_dict('index')
 for feature in states_geojson['features']:
     state_name = feature['properties']['name']
-    state_data = data[data['State'] == state_name].iloc[0] if not data[data['State'] == state_name].empty else None
-    feature['properties']['Total.Number'] = state_data['Total.Number'] if state_data is not None else 0
-    feature['properties']['Total.Population'] = state_data['Total.Population'] if state_data is not None else 0
-    for col in age_columns:
-        feature['properties'][col] = state_data[col] if state_data is not None and col in state_data else 0
+    state_data = state_records.get(state_name)
+    feature['properties'].update({col: state_data[col] if state_data is not None else 0 for col in feature_columns})
+
+# Index the enriched features by state name for the selected-state map layer
+feature_by_name = {feature['properties']['name']: feature for feature in states_geojson['features']}
 
 
 # Initialize Panel with necessary extensions
 pn.extension()
 
-state_options = ['All'] + sorted(data['State'].dropna().unique().tolist())
+state_options = ['All'] + data['State'].drop_duplicates().dropna().sort_values().tolist()
 state_selector = pn.widgets.Select(name='State', options=state_options, value='All', width_policy='max')
 
 
+@lru_cache(maxsize=64)
 def create_map(selected_state):
     center = [50, -115]
     zoom_start = 3
     m = folium.Map(location=center, zoom_start=zoom_start, tiles='CartoDB positron')
 
-    # Add a Choropleth layer and GeoJson for tooltips
+    # Add a Choropleth layer with tooltips
     choropleth = folium.Choropleth(
         geo_data=states_geojson,
         name='choropleth',
@@ -70,24 +146,15 @@ def create_map(selected_state):
         legend_name='Cancer Deaths'
     ).add_to(m)
 
-    folium.GeoJson(
-        data=states_geojson,
-        style_function=lambda feature: {'fillColor': '#transparent', 'color': '#transparent', 'fillOpacity': 0,
-                                        'weight': 0},  # Make transparent
-        highlight_function=lambda x: {'weight': 0, 'fillColor': 'transparent', 'color': 'transparent',
-                                      'weight': 0},
-        tooltip=GeoJsonTooltip(
-            fields=['name', 'Total.Population', 'Total.Number'],
-            aliases=['State:', 'Cumulative Population:', 'Total Deaths:'],
-            localize=True
-        ),
-        clickable=False
-
-    ).add_to(m)
+    # Attach the tooltip to the choropleth's own layer so the GeoJSON is embedded only once
+    choropleth.geojson.add_child(GeoJsonTooltip(
+        fields=['name', 'Total.Population', 'Total.Number'],
+        aliases=['State:', 'Cumulative Population:', 'Total Deaths:'],
+        localize=True
+    ))
 
     if selected_state != 'All':
-        state_geo = next(
-            (feat for feat in states_geojson['features'] if feat['properties']['name'] == selected_state), None)
+        state_geo = feature_by_name.get(selected_state)
         if state_geo:
             style_function = lambda feature: {
                 'fillColor': choropleth.color_scale(feature['properties']['Total.Number']),
@@ -113,70 +180,60 @@ def create_map(selected_state):
     return m._repr_html_()
 
 
-def create_pie_chart(selected_state):
-    df = data.copy()
-    # Filter data for the selected state or use all states
-    if selected_state != 'All':
-        df = df[df['State'] == selected_state]
-    else:
-        num_states = len(df['State'].unique())
-
-    # Create a mapping of the types to more friendly names
-    type_to_name = {
-        'Types.Breast.Total': 'Breast Cancer',
-        'Types.Colorectal.Total': 'Colorectal Cancer',
-        'Types.Lung.Total': 'Lung Cancer'
-    }
-
-    # Update the cancer_types with the friendly names
-    cancer_types = [type_to_name[typ] for typ in type_to_name.keys()]
-    counts = [int(df[typ].sum()) for typ in type_to_name.keys()]  # Ensure counts are integers
-    if selected_state == 'All':
-        # Calculate average counts per state if 'All' is selected
-        counts = [int(df[typ].sum() / num_states) for typ in type_to_name.keys()]
-    else:
-        counts = [int(df[typ].sum()) for typ in
-                  type_to_name.keys()]  # Ensure counts are integers for selected state
+# Per-state integer totals, including an 'All' entry holding the average per state
+pie_by_state = data.groupby('State')[list(type_to_name)].sum()
+pie_by_state.loc['All'] = pie_by_state.mean()
+pie_counts = dict(zip(pie_by_state.index, pie_by_state.astype(int).to_numpy().tolist()))
+# Update the cancer_types with the friendly names
+cancer_types = list(type_to_name.values())
+
+
+# Define a custom palette
+type_palette = ['#FAD5A5', '#7E0202', '#A36A00']
+
+
+@lru_cache(maxsize=64)
+def pie_chart_data(selected_state):
+    counts = pie_counts[selected_state]
 
     # Convert counts to angle
     data_for_pie = pd.DataFrame({'cancer_types': cancer_types, 'counts': counts})
     data_for_pie['angle'] = data_for_pie['counts'] / data_for_pie['counts'].sum() * 2 * pi
+    data_for_pie['color'] = type_palette[:len(cancer_types)]
 
-    # Define a custom palette
-    type_palette = ['#FAD5A5', '#7E0202', '#A36A00']
+    return ColumnDataSource.from_df(data_for_pie)
 
-    data_for_pie['color'] = type_palette[:len(cancer_types)]
 
-    source = ColumnDataSource(data_for_pie)
+# The pie figure is built once; selections only replace its source data and title
+pie_source = ColumnDataSource(pie_chart_data('All'))
 
-    hover = HoverTool(tooltips=[("Type", "@cancer_types"), (
-        "Rate(per 100,000)", "@counts{0,0}")])  # The format here should show the actual count
+hover = HoverTool(tooltips=[("Type", "@cancer_types"), (
+    "Rate(per 100,000)", "@counts{0,0}")])  # The format here should show the actual count
 
-    p = figure(height=450,
-               title=f"Type in {selected_state}" if selected_state != 'All' else "Type for All States",
-               toolbar_location=None, tools=[hover], x_range=(-0.5, 1.0))
+pie_figure = figure(height=450, title="Type for All States", toolbar_location=None, tools=[hover],
+                    x_range=(-0.5, 1.0))
 
-    p.wedge(x=0, y=1, radius=0.4,
-            start_angle=cumsum('angle', include_zero=True), end_angle=cumsum('angle'),
-            line_color="white", fill_color='color', legend_field='cancer_types', source=source)
+pie_figure.wedge(x=0, y=1, radius=0.4,
+                 start_angle=cumsum('angle', include_zero=True), end_angle=cumsum('angle'),
+                 line_color="white", fill_color='color', legend_field='cancer_types', source=pie_source)
 
-    p.axis.axis_label = None
-    p.axis.visible = False
-    p.grid.grid_line_color = None
+pie_figure.axis.axis_label = None
+pie_figure.axis.visible = False
+pie_figure.grid.grid_line_color = None
 
-    # Position and style the legend
-    p.legend.location = "bottom_right"
-    p.legend.orientation = "vertical"
-    p.legend.label_text_font_size = '10pt'  # Adjust font size
-    p.legend.padding = 2  # Decrease padding to move legend closer
-    p.legend.margin = 2  # Decrease margin to move legend closer
+# Position and style the legend
+pie_figure.legend.location = "bottom_right"
+pie_figure.legend.orientation = "vertical"
+pie_figure.legend.label_text_font_size = '10pt'  # Adjust font size
+pie_figure.legend.padding = 2  # Decrease padding to move legend closer
+pie_figure.legend.margin = 2  # Decrease margin to move legend closer
 
-    return p
 
+def create_pie_chart(selected_state):
+    pie_source.data = pie_chart_data(selected_state)
+    pie_figure.title.text = f"Type in {selected_state}" if selected_state != 'All' else "Type for All States"
+    return pie_figure
 
-# Define categories and races for the bar chart
-races = ['White', 'Hispanic', 'Asian', 'Black', 'Indigenous']
-genders = ['Female', 'Male']
 
 female_palette = {
     'Hispanic': '#B30000',
@@ -194,58 +251,69 @@ male_palette = {
 }
 
 
+race_gender_index = pd.MultiIndex.from_product([races, genders], names=['Race', 'Gender'])
+
+# Per-state rates with an extra 'All' row holding the average per state
+bar_by_state = data.groupby('State')[race_gender_columns].sum()
+bar_by_state.loc['All'] = bar_by_state.mean()
+
+
+@lru_cache(maxsize=64)
+def nested_bars_data(selected_state):
+    totals = pd.Series(bar_by_state.loc[selected_state].to_numpy(), index=race_gender_index, name='Count')
+    df = totals.reset_index()
+    # Assign color based on gender
+    df['Color'] = np.where(df['Gender'] == 'Male', df['Race'].map(male_palette), df['Race'].map(female_palette))
+    df['Gender_Race'] = list(zip(df['Gender'], df['Race']))
+    return ColumnDataSource.from_df(df)
+
+
+# The bar figure is built once; the race/gender factors are the same for every selection
+bars_source = ColumnDataSource(nested_bars_data('All'))
+
+bars_figure = figure(x_range=FactorRange(*[(gender, race) for race, gender in race_gender_index]), height=350,
+                     title="Race and Gender for All States", toolbar_location=None, sizing_mode='scale_width')
+
+bars_figure.vbar(x='Gender_Race', top='Count', width=0.9, source=bars_source,
+                 line_color='white', fill_color='Color')
+
+bars_figure.add_tools(
+    HoverTool(tooltips=[("Gender", "@Gender"), ("Race", "@Race"), ("Rate(per 100,000)", "@Count{0,0}")]))
+bars_figure.y_range.start = 0
+bars_figure.xgrid.grid_line_color = None
+bars_figure.xaxis.major_label_orientation = 1
+
+
 def create_nested_bars(selected_state):
-    df = data.copy()
-    # Filter data for the selected state or use all states
-    if selected_state != 'All':
-        df = df[df['State'] == selected_state]
-    else:
-        num_states = len(df['State'].unique())
-    # Calculate the sums for each race and gender
-    rows = []
-    for race in races:
-        for gender in genders:
-            count = df[f'Rates.Race and Sex.{gender}.{race}'].sum()
-            if selected_state == 'All' and num_states > 0:
-                count /= num_states  # Calculate the average count per state
-            rows.append({
-                'Gender': gender,
-                'Race': race,
-                'Count': count,
-                'Color': male_palette[race] if gender == 'Male' else female_palette[race]
-                # Assign color based on gender
-            })
-    df = pd.DataFrame(rows)
-    df['Gender_Race'] = df.apply(lambda x: (x['Gender'], x['Race']), axis=1)
-    source = ColumnDataSource(df)
-
-    title = f"Race and Gender in {selected_state}" if selected_state != 'All' else "Race and Gender for All States"
-    p = figure(x_range=FactorRange(*df['Gender_Race'].unique()), height=350, title=title, toolbar_location=None,
-               sizing_mode='scale_width')
-
-    p.vbar(x='Gender_Race', top='Count', width=0.9, source=source,
-           line_color='white', fill_color='Color')
-
-    p.add_tools(
-        HoverTool(tooltips=[("Gender", "@Gender"), ("Race", "@Race"), ("Rate(per 100,000)", "@Count{0,0}")]))
-    p.y_range.start = 0
-    p.xgrid.grid_line_color = None
-    p.xaxis.major_label_orientation = 1
-
-    return p
-
-
-pn.depends(state_selector.param.value)
+    bars_source.data = nested_bars_data(selected_state)
+    bars_figure.title.text = (f"Race and Gender in {selected_state}" if selected_state != 'All'
+                              else "Race and Gender for All States")
+    return bars_figure
+
+
+# Panes are created once and only their objects are swapped when the selection changes
+map_pane = pn.pane.HTML(sizing_mode='stretch_width')
+pie_pane = pn.pane.Bokeh()
+bars_pane = pn.pane.Bokeh()
 
 
 def update_components(selected_state):
-    map_html = create_map(selected_state)
-    return pn.Column(pn.pane.HTML(map_html, sizing_mode='stretch_width'),
-                     pn.Row(create_pie_chart(selected_state), create_nested_bars(selected_state)))
+    map_pane.object = create_map(selected_state)
+    pie_pane.object = create_pie_chart(selected_state)
+    bars_pane.object = create_nested_bars(selected_state)
+
+
+# Pre-render every selection at startup so interactions are served from the builder caches
+with ThreadPoolExecutor(max_workers=8) as executor:
+    for builder in (create_map, pie_chart_data, nested_bars_data):
+        list(executor.map(builder, state_options))
 
 
 # Create a Markdown pane for the heading
 heading = pn.pane.Markdown("# Cancer Deaths in the USA (2007-2013)")
 heading.style = {'font-size': '20pt', 'font-weight': 'bold', 'margin': '10px 0 20px 0', }
 
-dashboard = pn.Column(heading, state_selector, update_components)
\ No newline at end of file
+update_components(state_selector.value)
+state_selector.param.watch(lambda event: update_components(event.new), 'value')
+
+dashboard = pn.Column(heading, state_selector, map_pane, pn.Row(pie_pane, bars_pane))